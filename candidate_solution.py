@@ -1,14 +1,89 @@
 # candidate_solution.py
 import sqlite3
 import os
+import re
+import json
+import time
+import random
+import queue
+import threading
+from contextlib import asynccontextmanager, contextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from typing import List, Optional
 import uvicorn
+import httpx
+import orjson
 import requests
-import difflib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from rapidfuzz import fuzz, process
 
 # --- Constants ---
 DB_NAME = "pokemon_assessment.db"
+OFFICIAL_NAMES_URL = "https://pokeapi.co/api/v2/pokemon?limit=2000"
+OFFICIAL_NAMES_GRAPHQL_URL = "https://beta.pokeapi.co/graphql/v1beta"
+OFFICIAL_NAMES_GRAPHQL_QUERY = "{ pokemon_v2_pokemon(limit: 2000, order_by: {id: asc}) { name } }"
+OFFICIAL_NAMES_CACHE = "pokenames.json"
+OFFICIAL_NAMES_TTL = 86400  # seconds
+POOL_SIZE = 4
+POOL_TIMEOUT = 10  # seconds
+MMAP_SIZE = 256 * 1024 * 1024  # bytes
+HTTP_TIMEOUT = 5  # seconds
+
+# --- HTTP Session ---
+# One shared session for the PokeAPI calls, so they reuse open connections
+# instead of doing a new TCP and TLS handshake every time.
+_HTTP = requests.Session()
+_HTTP.mount(
+    "https://",
+    HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=Retry(total=3, backoff_factor=0.3))
+)
+
+# --- Queries ---
+# The read endpoints share these exact SQL strings, so each pooled connection's
+# statement cache only prepares (parses and plans) them once.
+# A pokemon can be linked to the same ability or trainer several times, so those
+# queries select through an IN subquery, which looks each id up once, rather than
+# joining and sorting out the repeats with DISTINCT.
+QUERIES = {
+    "pokemon_by_ability": """
+        SELECT p.name
+        FROM pokemon p
+        WHERE p.id IN (
+            SELECT tpa.pokemon_id
+            FROM trainer_pokemon_abilities tpa
+            JOIN abilities a ON a.id = tpa.ability_id
+            WHERE a.name_ci = LOWER(?)
+        )
+    """,
+    "pokemon_by_type": """
+        SELECT p.name
+        FROM types t
+        JOIN pokemon p ON p.type1_id = t.id OR p.type2_id = t.id
+        WHERE t.name_ci = LOWER(?)
+    """,
+    "trainers_by_pokemon": """
+        SELECT tr.name
+        FROM trainers tr
+        WHERE tr.id IN (
+            SELECT tpa.trainer_id
+            FROM trainer_pokemon_abilities tpa
+            JOIN pokemon p ON p.id = tpa.pokemon_id
+            WHERE p.name_ci = LOWER(?)
+        )
+    """,
+    "abilities_by_pokemon": """
+        SELECT a.name
+        FROM abilities a
+        WHERE a.id IN (
+            SELECT tpa.ability_id
+            FROM trainer_pokemon_abilities tpa
+            JOIN pokemon p ON p.id = tpa.pokemon_id
+            WHERE p.name_ci = LOWER(?)
+        )
+    """,
+}
 
 # --- Database Connection ---
 def connect_db() -> Optional[sqlite3.Connection]:
@@ -21,7 +96,6 @@ def connect_db() -> Optional[sqlite3.Connection]:
         print(f"Error: Database file '{DB_NAME}' not found.")
         return None
 
-    connection = None
     try:
         # --- Implement Here ---
         # I connect to the DB we created and then return the object if successful
@@ -32,9 +106,123 @@ def connect_db() -> Optional[sqlite3.Connection]:
         print(f"Database connection error: {e}")
         return None
 
-    return connection
+def _open_pooled_connection() -> Optional[sqlite3.Connection]:
+    """
+    Open a connection for the API's connection pool.
+    It can be handed between worker threads and leaves transactions to the caller.
+    Return None if connection fails.
+    """
+    if not os.path.exists(DB_NAME):
+        print(f"Error: Database file '{DB_NAME}' not found.")
+        return None
+
+    try:
+        conn = sqlite3.connect(DB_NAME, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        # Read pages straight from a memory-mapped file rather than copying them in with read()
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+    except sqlite3.Error as e:
+        print(f"Database connection error: {e}")
+        return None
+
+def _has_name_indexes(conn: sqlite3.Connection) -> bool:
+    """
+    Check the database has the name_ci columns and unique indexes that clean_database creates.
+    The endpoints look names up through them and create_pokemon upserts on them.
+    """
+    cursor = conn.execute(
+        """
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE type = 'index'
+          AND name IN ('ux_pokemon_name_ci', 'ux_types_name_ci', 'ux_abilities_name_ci', 'ux_trainers_name_ci')
+        """
+    )
+    return cursor.fetchone()[0] == 4
 
 # --- Data Cleaning ---
+def _fetch_official_names() -> List[str]:
+    """
+    Fetch the official pokemon names from the PokeAPI.
+    The GraphQL API is asked for just the names, which is a much smaller download than
+    the REST list with its URLs. The REST list is used if the GraphQL API is unavailable.
+    An empty list is an error, so it is never cached in place of the real names.
+    """
+    try:
+        apiresponse = _HTTP.post(
+            OFFICIAL_NAMES_GRAPHQL_URL,
+            json={"query": OFFICIAL_NAMES_GRAPHQL_QUERY},
+            timeout=HTTP_TIMEOUT
+        )
+        apiresponse.raise_for_status()
+        official_list = [ entry["name"] for entry in orjson.loads(apiresponse.content)["data"]["pokemon_v2_pokemon"] ]
+        if not official_list:
+            raise ValueError("Official list is empty.")
+        return official_list
+    except Exception as ex:
+        print(f"Official list not fetched from GraphQL, using the REST list: {ex}")
+
+    apiresponse = _HTTP.get(OFFICIAL_NAMES_URL, timeout=HTTP_TIMEOUT)
+    apiresponse.raise_for_status()
+    official_list = [ entry["name"] for entry in orjson.loads(apiresponse.content)["results"] ]
+    if not official_list:
+        raise ValueError("Official list is empty.")
+    return official_list
+
+def _read_official_names_cache(cache_path: str) -> Optional[List[str]]:
+    """Return the cached official names, or None if the cache is missing or unreadable."""
+    try:
+        with open(cache_path) as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError) as ex:
+        print(f"Official list cache not read: {ex}")
+        return None
+
+def _load_official_names(cache_path: str = OFFICIAL_NAMES_CACHE, ttl: int = OFFICIAL_NAMES_TTL) -> List[str]:
+    """
+    Return the official pokemon names from the PokeAPI.
+    The list is cached on disk and only fetched again once the cache is older than `ttl`
+    (or can't be read). If the fetch fails, a stale cache is used before falling back to
+    an empty list. A cache that can't be written is skipped rather than stopping the clean.
+    """
+    cache_exists = os.path.exists(cache_path)
+    if cache_exists and time.time() - os.path.getmtime(cache_path) < ttl:
+        cached_list = _read_official_names_cache(cache_path)
+        if cached_list:
+            return cached_list
+
+    try:
+        official_list = _fetch_official_names()
+    except Exception as ex:
+        print(f"Official list not fetched: {ex}")
+        cached_list = _read_official_names_cache(cache_path) if cache_exists else None
+        return cached_list or []
+
+    # Write to a temporary file and swap it in, so an interrupted run can't leave a partial cache
+    temp_path = f"{cache_path}.tmp"
+    try:
+        with open(temp_path, "w") as cache_file:
+            json.dump(official_list, cache_file)
+        os.replace(temp_path, cache_path)
+    except OSError as ex:
+        print(f"Official list cache not written: {ex}")
+    return official_list
+
+# str.title() capitalises a lone letter after an apostrophe (Farfetch'D), which is put back
+_APOSTROPHE_SUFFIX_RE = re.compile(r"'([^\W\d_])\b")
+
+def _titlecase(name: Optional[str]) -> Optional[str]:
+    """
+    Strip whitespace and title-case a name, leaving NULLs untouched.
+    A single letter after an apostrophe stays lower case (Farfetch'd), but longer
+    words after one are still capitalised (O'Neil).
+    """
+    if name is None:
+        return None
+    return _APOSTROPHE_SUFFIX_RE.sub(lambda suffix: suffix.group(0).lower(), name.strip().title())
+
 def clean_database(conn: sqlite3.Connection):
     """
     Task 2: Clean up the database using the provided connection object.
@@ -51,160 +239,246 @@ def clean_database(conn: sqlite3.Connection):
     cursor = conn.cursor()
     print("Starting database cleaning...")
 
+    # Manage the transaction explicitly so the whole clean-up is written in one go.
+    # journal_mode can't be changed inside a transaction, so the PRAGMAs come first.
+    previous_isolation_level = conn.isolation_level
+    conn.isolation_level = None
+
     try:
         # --- Implement Here ---
-        # Correct misspellings using the pokemon API to fetch the list of official names.
-        # I did this first, so the duplicates can be removed.
-        try:
-            apiapiresponse = requests.get("https://pokeapi.co/api/v2/pokemon?limit=2000")
-            apiapiresponse.raise_for_status()
-            official_list = [ entry["name"] for entry in apiapiresponse.json().get("results", []) ]
-        except Exception as ex:
-            print(f"Official list not fetched: {ex}")
-            official_list = []
-
-        cursor.execute("SELECT id, name FROM pokemon")
-        db_rows = cursor.fetchall()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-64000")
 
-        import difflib
-        for pokeid, old_name in db_rows:
-            old_name_lower = old_name.strip().lower()
+        # Strip and title-case names from SQL. Duplicates are grouped on the same cleaned
+        # name the casing step produces, so the names are unique once cleaning is done.
+        conn.create_function("titlecase", 1, _titlecase, deterministic=True)
 
-            # Do nothing if its in the official list
-            if old_name_lower in official_list:
-                continue
-
-            # Find a close match if it's not in the list
-            matches = difflib.get_close_matches(old_name_lower, official_list, n=1, cutoff=0.8)
-            if matches:
-                corrected = matches[0]      
-                if corrected != old_name_lower:
-                    cursor.execute(
-                        "UPDATE pokemon SET name = ? WHERE id = ?",
-                        (corrected.title(), pokeid)
-                    )
-
-        # Remove duplicates from all tables
-        cursor.execute(
-            """
-            DELETE FROM pokemon
-            WHERE id NOT IN(
-                SELECT MIN(id) FROM pokemon
-                GROUP BY LOWER(name)
-            );
-            """
-        )
+        # The official list is cached on disk, and loaded before taking the write lock.
+        # It is kept as a set as well so membership checks are O(1).
+        official_list = _load_official_names()
+        official_names = set(official_list)
 
-        cursor.execute(
-            """
-            DELETE FROM types
-            WHERE id NOT IN (
-                SELECT MIN(id) FROM types
-                GROUP BY LOWER(name)
-            );
-            """
-        )
+        cursor.execute("BEGIN IMMEDIATE")
 
-        cursor.execute(
-            """
-            DELETE FROM abilities
-            WHERE id NOT IN (
-                SELECT MIN(id) FROM abilities
-                GROUP BY LOWER(name)
-            );
-            """
-        )
+        # Drop the name indexes while cleaning and rebuild them at the end. This saves
+        # maintaining them on every update, and corrections may briefly duplicate a name.
+        for table in ("pokemon", "types", "abilities", "trainers"):
+            cursor.execute(f"DROP INDEX IF EXISTS ux_{table}_name_ci")
 
-        cursor.execute(
-            """
-            DELETE FROM trainers
-            WHERE id NOT IN (
-                SELECT MIN(id) FROM trainers
-                GROUP BY LOWER(name)
-            );
-            """
-        )
-
-        # Standardise casing. I strip whitesapce and use title() for sentence case
+        # Correct misspellings using the pokemon API to fetch the list of official names.
+        # I did this first, so the duplicates can be removed.
         cursor.execute("SELECT id, name FROM pokemon")
         db_rows = cursor.fetchall()
-        for pokeid, pokename in db_rows:
-            clean_name = pokename.strip().title()
-            cursor.execute(
-                "UPDATE pokemon SET name = ? WHERE id = ?",
-                (clean_name, pokeid)
-            )
 
-        cursor.execute("SELECT id, name FROM types")
-        db_rows = cursor.fetchall()
-        for typeid, typename in db_rows:
-            clean_name = typename.strip().title()
-            cursor.execute(
-                "UPDATE types SET name = ? WHERE id = ?",
-                (clean_name, typeid)
-            )
-
-        cursor.execute("SELECT id, name FROM abilities")
-        db_rows = cursor.fetchall()
-        for abilityid, abilityname in db_rows:
-            clean_name = abilityname.strip().title()
-            cursor.execute(
-                "UPDATE abilities SET name = ? WHERE id = ?",
-                (clean_name, abilityid)
+        # Do nothing if its in the official list
+        unmatched_rows = []
+        for pokeid, old_name in db_rows:
+            old_name_lower = old_name.strip().lower()
+            if old_name_lower not in official_names:
+                unmatched_rows.append((pokeid, old_name_lower))
+
+        # Find a close match for the rest. cdist scores every name against the whole
+        # official list in one call, running in C++ across all cores.
+        corrections = []
+        if unmatched_rows and official_list:
+            scores = process.cdist(
+                [old_name_lower for _, old_name_lower in unmatched_rows],
+                official_list,
+                scorer=fuzz.ratio,
+                workers=-1
             )
+            best_matches = scores.argmax(axis=1)
+            for (pokeid, _), row_scores, best in zip(unmatched_rows, scores, best_matches):
+                if row_scores[best] >= 80:
+                    corrections.append((_titlecase(official_list[best]), pokeid))
 
-        cursor.execute("SELECT id, name FROM trainers")
-        db_rows = cursor.fetchall()
-        for trainerid, trainername in db_rows:
-            clean_name = trainername.strip().title()
-            cursor.execute(
-                "UPDATE trainers SET name = ? WHERE id = ?",
-                (clean_name, trainerid)
-            )
+        # Apply all the corrections through one prepared statement
+        cursor.executemany("UPDATE pokemon SET name = ? WHERE id = ?", corrections)
 
-        # Remove redundant data. It looks like this is only applicable in types,
+        # Remove duplicates from all tables.
+        # Also remove redundant data. It looks like this is only applicable in types,
         # but I wrote the code to check everywhere since it is not specified in the instructions.
+        # Both are done in the same DELETE so each table is only scanned once, and before
+        # the casing below so those rows aren't rewritten just to be deleted. Both match on
+        # titlecase(name), the value the casing writes, so padding of any kind is ignored.
         cursor.execute(
             """
             DELETE FROM pokemon
-            WHERE name IN ('---', '???', '')
+            WHERE titlecase(name) IN ('---', '???', '')
+               OR id NOT IN (
+                   SELECT MIN(id) FROM pokemon
+                   GROUP BY LOWER(titlecase(name))
+               );
             """
         )
+
         cursor.execute(
             """
             DELETE FROM types
-            WHERE name IN ('---', '???', '')
+            WHERE titlecase(name) IN ('---', '???', '')
+               OR id NOT IN (
+                   SELECT MIN(id) FROM types
+                   GROUP BY LOWER(titlecase(name))
+               );
             """
         )
+
         cursor.execute(
             """
             DELETE FROM abilities
-            WHERE name IN ('---', '???', '')
+            WHERE titlecase(name) IN ('---', '???', '')
+               OR id NOT IN (
+                   SELECT MIN(id) FROM abilities
+                   GROUP BY LOWER(titlecase(name))
+               );
             """
         )
+
         cursor.execute(
             """
             DELETE FROM trainers
-            WHERE name IN ('---', '???', '')
+            WHERE titlecase(name) IN ('---', '???', '')
+               OR id NOT IN (
+                   SELECT MIN(id) FROM trainers
+                   GROUP BY LOWER(titlecase(name))
+               );
             """
         )
 
+        # Standardise casing. I strip whitespace and title-case the names.
+        # Using the SQL function lets each table be fixed in a single UPDATE
+        # instead of a SELECT followed by one UPDATE per row. Rows that are
+        # already clean are skipped so their pages aren't rewritten.
+        cursor.execute("UPDATE pokemon SET name = titlecase(name) WHERE name IS NOT titlecase(name)")
+        cursor.execute("UPDATE types SET name = titlecase(name) WHERE name IS NOT titlecase(name)")
+        cursor.execute("UPDATE abilities SET name = titlecase(name) WHERE name IS NOT titlecase(name)")
+        cursor.execute("UPDATE trainers SET name = titlecase(name) WHERE name IS NOT titlecase(name)")
+
+        # name_ci is a generated lower-case copy of the name, so SQLite keeps it up to date.
+        # Indexing it lets the endpoints match names with a plain equality lookup instead
+        # of calling LOWER() on each row. ALTER TABLE can only add VIRTUAL generated columns,
+        # but the index stores the values, so lookups never compute them.
+        # The names are unique by now, so the indexes are UNIQUE and create_pokemon can upsert on them.
+        for table in ("pokemon", "types", "abilities", "trainers"):
+            # table_info leaves out generated columns, so look in table_xinfo
+            columns = [column[1] for column in cursor.execute(f"PRAGMA table_xinfo({table})")]
+            if "name_ci" not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN name_ci TEXT GENERATED ALWAYS AS (LOWER(name)) VIRTUAL")
+            cursor.execute(f"CREATE UNIQUE INDEX ux_{table}_name_ci ON {table}(name_ci)")
+
+        # Index the joins the endpoints make. They are built last so the clean-up
+        # above doesn't have to maintain them.
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pokemon_type1 ON pokemon(type1_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pokemon_type2 ON pokemon(type2_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tpa_pokemon ON trainer_pokemon_abilities(pokemon_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tpa_ability ON trainer_pokemon_abilities(ability_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tpa_trainer ON trainer_pokemon_abilities(trainer_id)")
+
+        cursor.execute("COMMIT")
         # --- End Implementation ---
-        conn.commit()
         print("Database cleaning finished and changes committed.")
 
     except sqlite3.Error as e:
         print(f"An error occurred during database cleaning: {e}")
         conn.rollback()  # Roll back changes on error
 
+    finally:
+        conn.isolation_level = previous_isolation_level
+
 # --- FastAPI Application ---
+def _get_or_create_ids(cursor: sqlite3.Cursor, table: str, names: List[str]) -> dict:
+    """
+    Return a {name_ci: id} mapping for the given lower-case names in `table` (types or abilities).
+    A single upsert adds any missing rows and returns the ids of new and existing rows alike.
+    """
+    if not names:
+        return {}
+
+    values = ", ".join("(?)" for _ in names)
+    cursor.execute(
+        f"""
+        INSERT INTO {table} (name) VALUES {values}
+        ON CONFLICT(name_ci) DO UPDATE SET name = name
+        RETURNING name_ci, id
+        """,
+        [_titlecase(name) for name in names]
+    )
+    return dict(cursor.fetchall())
+
 def create_fastapi_app() -> FastAPI:
     """
     FastAPI application instance.
     Define the FastAPI app and include all the required endpoints below.
     """
     print("Creating FastAPI app and defining endpoints...")
-    app = FastAPI(title="Pokemon Assessment API")
+
+    # Reuse a small pool of open connections instead of connecting on every request,
+    # so the schema is only parsed once and the page cache stays warm between requests.
+    # At most POOL_SIZE connections are ever open; further requests wait for one to be returned.
+    pool: queue.Queue = queue.Queue(maxsize=POOL_SIZE)
+    pool_slots = threading.BoundedSemaphore(POOL_SIZE)
+
+    @contextmanager
+    def pooled_connection():
+        if not pool_slots.acquire(timeout=POOL_TIMEOUT):
+            raise HTTPException(status_code=503, detail="Database busy.")
+        try:
+            try:
+                conn = pool.get_nowait()
+            except queue.Empty:
+                conn = _open_pooled_connection()
+                if not conn:
+                    raise HTTPException(status_code=500, detail="DB connection failed.")
+                if not _has_name_indexes(conn):
+                    conn.close()
+                    raise HTTPException(status_code=503, detail="Database has not been cleaned.")
+
+            try:
+                yield conn
+            finally:
+                # Never hand an open transaction to the next request
+                if conn.in_transaction:
+                    conn.rollback()
+                pool.put_nowait(conn)
+        finally:
+            pool_slots.release()
+
+    # An async client lets create_pokemon wait on the PokeAPI without blocking other requests.
+    # Lifespan owns the shared client and closes it on shutdown. If lifespan never runs (e.g. when
+    # mounted as a sub-app) each request gets its own client and closes it, so none are left open.
+    shared_http_client: dict = {}
+
+    def new_http_client() -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            transport=httpx.AsyncHTTPTransport(retries=3, limits=httpx.Limits(max_connections=20))
+        )
+
+    @asynccontextmanager
+    async def http_client():
+        if "client" in shared_http_client:
+            yield shared_http_client["client"]
+        else:
+            async with new_http_client() as client:
+                yield client
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        shared_http_client["client"] = new_http_client()
+        try:
+            yield
+        finally:
+            await shared_http_client.pop("client").aclose()
+            while not pool.empty():
+                pool.get_nowait().close()
+
+    app = FastAPI(title="Pokemon Assessment API", lifespan=lifespan)
+
+    # Trainer ids for create_pokemon's random assignment. Nothing in the API adds or removes
+    # trainers, so they are read once; clear this if that ever changes.
+    trainer_ids: List[int] = []
 
     # --- Define Endpoints Here ---
     @app.get("/")
@@ -225,21 +499,10 @@ def create_fastapi_app() -> FastAPI:
         Query the cleaned database. Handle cases where the ability doesn't exist.
         """
         # --- Implement here ---
-        conn = connect_db()
-        if not conn:
-            raise HTTPException(status_code=500, detail="DB connection failed.")
-
-        cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT p.name
-            FROM pokemon p
-            JOIN trainer_pokemon_abilities tpa ON p.id = tpa.pokemon_id
-            JOIN abilities a ON a.id = tpa.ability_id
-            WHERE LOWER(a.name) = LOWER(?)
-        """
-        cursor.execute(query, (ability_name,))
-        db_rows = cursor.fetchall()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUERIES["pokemon_by_ability"], (ability_name,))
+            db_rows = cursor.fetchall()
 
         if not db_rows:
             return []
@@ -254,22 +517,10 @@ def create_fastapi_app() -> FastAPI:
         Query the cleaned database. Handle cases where the type doesn't exist.
         """
         # --- Implement here ---
-        conn = connect_db()
-        if not conn:
-            raise HTTPException(status_code=500, detail="DB connection failed.")
-
-        cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT p.name
-            FROM pokemon p
-            LEFT JOIN types t1 ON p.type1_id = t1.id
-            LEFT JOIN types t2 ON p.type2_id = t2.id
-            WHERE LOWER(t1.name) = LOWER(?)
-               OR LOWER(t2.name) = LOWER(?)
-        """
-        cursor.execute(query, (type_name, type_name))
-        db_rows = cursor.fetchall()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUERIES["pokemon_by_type"], (type_name,))
+            db_rows = cursor.fetchall()
 
         return [db_row[0] for db_row in db_rows] if db_rows else []
         # --- End Implementation ---
@@ -281,21 +532,10 @@ def create_fastapi_app() -> FastAPI:
         Query the cleaned database. Handle cases where the Pokemon doesn't exist or has no trainer.
         """
         # --- Implement here ---
-        conn = connect_db()
-        if not conn:
-            raise HTTPException(status_code=500, detail="DB connection failed.")
-
-        cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT tr.name
-            FROM trainers tr
-            JOIN trainer_pokemon_abilities tpa ON tr.id = tpa.trainer_id
-            JOIN pokemon p ON p.id = tpa.pokemon_id
-            WHERE LOWER(p.name) = LOWER(?)
-        """
-        cursor.execute(query, (pokemon_name,))
-        db_rows = cursor.fetchall()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUERIES["trainers_by_pokemon"], (pokemon_name,))
+            db_rows = cursor.fetchall()
 
         return [db_row[0] for db_row in db_rows] if db_rows else []
         # --- End Implementation ---
@@ -307,126 +547,91 @@ def create_fastapi_app() -> FastAPI:
         Query the cleaned database. Handle cases where the Pokemon doesn't exist.
         """
         # --- Implement here ---
-        conn = connect_db()
-        if not conn:
-            raise HTTPException(status_code=500, detail="DB connection failed.")
-
-        cursor = conn.cursor()
-        query = """
-            SELECT DISTINCT a.name
-            FROM abilities a
-            JOIN trainer_pokemon_abilities tpa ON a.id = tpa.ability_id
-            JOIN pokemon p ON p.id = tpa.pokemon_id
-            WHERE LOWER(p.name) = LOWER(?)
-        """
-        cursor.execute(query, (pokemon_name,))
-        db_rows = cursor.fetchall()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(QUERIES["abilities_by_pokemon"], (pokemon_name,))
+            db_rows = cursor.fetchall()
 
         return [db_row[0] for db_row in db_rows] if db_rows else []
         # --- End Implementation ---
 
     # --- Implement Task 8 here ---
     @app.post("/pokemon/create/{pokemon_name}")
-    def create_pokemon(pokemon_name: str):
-        import requests
-
-        conn = connect_db()
-        if not conn:
-            raise HTTPException(status_code=500, detail="DB connection failed.")
-
-        cursor = conn.cursor()
-
+    async def create_pokemon(pokemon_name: str):
         # Use the public pokemon API to find the pokemon's info
         poke_url = f"https://pokeapi.co/api/v2/pokemon/{pokemon_name.lower()}"
-        apiresponse = requests.get(poke_url)
+        async with http_client() as client:
+            apiresponse = await client.get(poke_url)
         if apiresponse.status_code != 200:
             raise HTTPException(status_code=404, detail="Pokemon not found.")
-        data = apiresponse.json()
+        data = orjson.loads(apiresponse.content)
 
-        # Get the pokemon's types
-        type_ids = []
-        for type_entry in data.get("types", []):
-            type_name = type_entry["type"]["name"].strip().lower()
+        # The database work is blocking, so it runs in the threadpool rather than on the event loop
+        new_tpa_ids = await run_in_threadpool(save_pokemon, pokemon_name, data)
+        return {"created_tpa_ids": new_tpa_ids}
 
-            cursor.execute("SELECT id FROM types WHERE LOWER(name) = LOWER(?)", (type_name,))
-            trow = cursor.fetchone()
+    def save_pokemon(pokemon_name: str, data: dict) -> List[int]:
+        """Store the pokemon from the PokeAPI data and return the new trainer_pokemon_abilities ids."""
+        # Only take the write lock once the API call is done
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
 
-            if trow:
-                type_id = trow[0]
-            else:
-                cursor.execute("INSERT INTO types (name) VALUES (?)", (type_name.title(),))
-                type_id = cursor.lastrowid
-            type_ids.append(type_id)
+            # Get the pokemon's types, looking them all up (or creating them) at once
+            type_names = [type_entry["type"]["name"].strip().lower() for type_entry in data.get("types", [])]
+            type_lookup = _get_or_create_ids(cursor, "types", type_names)
+            type_ids = [type_lookup[type_name] for type_name in type_names]
 
-        type1_id = type_ids[0] if len(type_ids) >= 1 else None
-        type2_id = type_ids[1] if len(type_ids) >= 2 else None
+            type1_id = type_ids[0] if len(type_ids) >= 1 else None
+            type2_id = type_ids[1] if len(type_ids) >= 2 else None
 
-        # If the pokemon exists, get the id, otherwise create it
-        cursor.execute(
-            "SELECT id FROM pokemon WHERE LOWER(name) = LOWER(?)",
-            (pokemon_name,)
-        )
-        db_row = cursor.fetchone()
-        if db_row:
-            pokemon_id = db_row[0]
-            # If the type has changed in the mean time, update it
-            cursor.execute(
-                "UPDATE pokemon SET type1_id = ?, type2_id = ? WHERE id = ?",
-                (type1_id, type2_id, pokemon_id)
-            )
-        else:
+            # Create the pokemon, or if it exists, update its types in case they changed in the mean time
             cursor.execute(
                 """
                 INSERT INTO pokemon (name, type1_id, type2_id)
                 VALUES (?, ?, ?)
+                ON CONFLICT(name_ci) DO UPDATE SET type1_id = excluded.type1_id, type2_id = excluded.type2_id
+                RETURNING id
                 """,
-                (pokemon_name.title(), type1_id, type2_id)
+                (_titlecase(pokemon_name), type1_id, type2_id)
             )
-            pokemon_id = cursor.lastrowid
+            pokemon_id = cursor.fetchone()[0]
 
-        # Do the same with abilities, if it exists, get the id, otherwise create it
-        new_tpa_ids = []
-        for entry in data.get("abilities", []):
-            abi = entry["ability"]
-            abi_name = abi["name"].strip().lower()
-            cursor.execute(
-                "SELECT id FROM abilities WHERE LOWER(name) = LOWER(?)",
-                (abi_name,)
-            )
-            abilityitem = cursor.fetchone()
-            if abilityitem:
-                ability_id = abilityitem[0]
-            else:
-                cursor.execute(
-                    "INSERT INTO abilities (name) VALUES (?)",
-                    (abi_name.title(),)
-                )
-                ability_id = cursor.lastrowid
+            # Do the same with abilities, if it exists, get the id, otherwise create it
+            ability_names = [entry["ability"]["name"].strip().lower() for entry in data.get("abilities", [])]
+            ability_lookup = _get_or_create_ids(cursor, "abilities", ability_names)
 
-            # Assign a random trainer
-            cursor.execute("SELECT id FROM trainers ORDER BY RANDOM() LIMIT 1")
-            trow = cursor.fetchone()
-            if not trow:
+            # Load the trainer ids on first use; they are cached for the life of the app
+            if not trainer_ids:
+                cursor.execute("SELECT id FROM trainers")
+                trainer_ids.extend(trow[0] for trow in cursor.fetchall())
+
+            # Assign a random trainer to each ability
+            if ability_names and not trainer_ids:
                 conn.rollback()
-                conn.close()
                 raise HTTPException(status_code=500, detail="No trainers in the table")
-            trainer_id = trow[0]
-
-            # create the new record
-            cursor.execute(
-                """
-                INSERT INTO trainer_pokemon_abilities (trainer_id, pokemon_id, ability_id)
-                VALUES (?, ?, ?)
-                """,
-                (trainer_id, pokemon_id, ability_id)
-            )
-            new_tpa_ids.append(cursor.lastrowid)
+            tpa_rows = [
+                (random.choice(trainer_ids), pokemon_id, ability_lookup[abi_name])
+                for abi_name in ability_names
+            ]
+
+            # create the new records with a single multi-row INSERT
+            new_tpa_ids = []
+            if tpa_rows:
+                values = ", ".join("(?, ?, ?)" for _ in tpa_rows)
+                cursor.execute(
+                    f"""
+                    INSERT INTO trainer_pokemon_abilities (trainer_id, pokemon_id, ability_id)
+                    VALUES {values}
+                    RETURNING id
+                    """,
+                    [value for tpa_row in tpa_rows for value in tpa_row]
+                )
+                new_tpa_ids = sorted(tpa_row[0] for tpa_row in cursor.fetchall())
 
-        conn.commit()
-        conn.close()
+            cursor.execute("COMMIT")
 
-        return {"created_tpa_ids": new_tpa_ids}
+        return new_tpa_ids
 
     # --- End Implementation ---
 